@@ -1,17 +1,34 @@
+import argparse
+import cProfile
+import csv
+import io
 import json
+import pstats
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
 from pathlib import Path
 from substrateinterface import SubstrateInterface
 from decimal import Decimal, getcontext
 from datetime import datetime
 
+WATCHED_COLLATOR = "LUCKYFRIDAY.IO"
+HISTORY_DIR = Path(__file__).parent / "history"
+
+# One fixed-width row per candidate per snapshot (a single row with an empty address
+# when there are none): timestamp, DesiredCandidates, CandidacyBond, deposit, who.
+# Amounts are stored as float64 Planck, which is plenty for analytics.
+HISTORY_ROW = struct.Struct("<qidd64s")
+HISTORY_DTYPE = [("timestamp", "<i8"), ("desired", "<i4"), ("bond", "<f8"), ("deposit", "<f8"), ("who", "S64")]
+
 def load_config():
     with open(Path(__file__).parent / "system_chains_config.json", encoding='utf-8') as f:
         return json.load(f)
 
-def format_deposit(chain_name, raw_deposit):
-    """Convert raw Planck deposit to proper token format"""
-    getcontext().prec = 8  # Set sufficient precision
-    
+def token_decimals(chain_name):
     # Define token decimals for different chains
     decimals = {
         'polkadot': 10,
@@ -34,6 +51,12 @@ def format_deposit(chain_name, raw_deposit):
         if key in chain_name.lower():
             dec_places = decimals[key]
             break
+    return dec_places
+
+def format_deposit(chain_name, raw_deposit):
+    """Convert raw Planck deposit to proper token format"""
+    getcontext().prec = 8  # Set sufficient precision
+    dec_places = token_decimals(chain_name)
     
     # Convert from Planck to main units
     if raw_deposit:
@@ -42,12 +65,100 @@ def format_deposit(chain_name, raw_deposit):
         return f"{amount:,.4f}"
     return "0.0000"
 
-def check_chain(chain_config):
-    print(f"\n{'='*50}")
-    print(f"🔍 Checking {chain_config['name']}")
-    print(f"📡 RPC: {chain_config['rpc_url']}")
-    print(f"{'='*50}")
+def save_snapshot(chain_config, deposits, desired_candidates, candidacy_bond):
+    """Append this run's deposits to the chain's history used by --analytics"""
+    timestamp = int(time.time())
+    entries = deposits.items() or [("", float("nan"))]
+    HISTORY_DIR.mkdir(exist_ok=True)
+    with open(HISTORY_DIR / f"{chain_config['name']}.bin", "ab") as f:
+        f.write(b"".join(
+            HISTORY_ROW.pack(timestamp, desired_candidates, candidacy_bond, amount, who.encode())
+            for who, amount in entries
+        ))
+
+RECORD_FIELDS = ("type", "chain", "rpc_url", "checked_at", "token", "decimals", "address", "name",
+                 "role", "deposit", "known", "status", "invulnerables", "candidates", "error")
+WATCH_MESSAGES = {
+    "invulnerable": "✅ {name} found in Invulnerables",
+    "candidate": "✅ {name} found in Candidates",
+    "inactive": "❌ {name} not currently active",
+    "unregistered": "❌ {name} not found in collator registry",
+}
+
+def format_text(records):
+    """Render one chain's records as the classic console report"""
+    first = records[0]
+    lines = ["", "=" * 50, f"🔍 Checking {first['chain']}", f"📡 RPC: {first['rpc_url']}", "=" * 50]
+    if first["type"] == "error":
+        lines += ["", f"❌ Error checking {first['chain']}: {first['error']}"]
+        return lines
+    
+    token = first["token"]
+    collators = [r for r in records if r["type"] == "collator"]
+    invulnerables = [r for r in collators if r["role"] == "invulnerable"]
+    candidates = [r for r in collators if r["role"] == "candidate"]
     
+    lines += ["", f"🔷 Invulnerable Collators ({len(invulnerables)})"]
+    for r in invulnerables:
+        lines.append(f"  {r['address'][:10]}...{r['address'][-6:]} ({r['name']})")
+    
+    lines += ["", f"🔶 Candidate Collators ({len(candidates)}) [Deposit in {token}]"]
+    for r in candidates:
+        deposit = format_deposit(first["chain"], r["deposit"])
+        lines.append(f"  {r['address'][:10]}...{r['address'][-6:]} ({r['name']}) - {deposit} {token}")
+    
+    for r in records:
+        if r["type"] == "watch":
+            lines += ["", WATCH_MESSAGES[r["status"]].format(name=r["name"])]
+    
+    unknown = [r for r in collators if not r["known"]]
+    if unknown:
+        lines += ["", "⚠️ Unknown Collators Detected:"]
+        for r in unknown:
+            lines.append(f"  {r['address']} - {format_deposit(first['chain'], r['deposit'])} {token}")
+    return lines
+
+class RecordWriter:
+    """Single buffered output for check results, flushed once per chain"""
+    
+    def __init__(self, fmt="text", stream=None):
+        self.fmt = fmt
+        # Always UTF-8 so the emoji report survives non-UTF-8 consoles and redirects
+        self.stream = stream or open(sys.stdout.fileno(), "w", encoding='utf-8', newline='',
+                                     buffering=1 << 16, closefd=False)
+        self.count = 0
+        self.csv = None
+    
+    def text(self, line):
+        if self.fmt == "text":
+            self.stream.write(line + "\n")
+    
+    def write_chain(self, records):
+        if self.fmt == "text":
+            self.stream.write("\n".join(format_text(records)) + "\n")
+        elif self.fmt == "ndjson":
+            self.stream.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        elif self.fmt == "json":
+            for r in records:
+                self.stream.write(("[\n" if self.count == 0 else ",\n") + json.dumps(r, ensure_ascii=False))
+                self.count += 1
+        elif self.fmt == "csv":
+            if self.csv is None:
+                self.csv = csv.DictWriter(self.stream, fieldnames=RECORD_FIELDS, restval="")
+                self.csv.writeheader()
+            self.csv.writerows(records)
+        self.flush()
+    
+    def flush(self):
+        self.stream.flush()
+    
+    def close(self):
+        if self.fmt == "json":
+            self.stream.write("[]\n" if self.count == 0 else "\n]\n")
+        self.flush()
+
+def check_chain(chain_config, writer):
+    name = chain_config["name"]
     try:
         # Load collators for this chain
         with open(Path(__file__).parent / chain_config["collator_file"], encoding='utf-8') as f:
@@ -62,66 +173,630 @@ def check_chain(chain_config):
         candidates = [c['who'] for c in candidate_data]
         deposits = {c['who']: c['deposit'] for c in candidate_data}
         
+        # Candidacy state recorded for --analytics
+        desired_candidates = substrate.query("CollatorSelection", "DesiredCandidates").value
+        candidacy_bond = substrate.query("CollatorSelection", "CandidacyBond").value
+        
         # Get token symbol
         properties = substrate.rpc_request("system_properties", [])
         token_symbol = properties['result']['tokenSymbol'][0] if 'result' in properties else 'TOKEN'
         
-        # Print results
-        print(f"\n🔷 Invulnerable Collators ({len(invulnerables)})")
-        for addr in invulnerables:
-            print(f"  {addr[:10]}...{addr[-6:]} ({collators.get(addr, 'UNKNOWN')})")
-        
-        print(f"\n🔶 Candidate Collators ({len(candidates)}) [Deposit in {token_symbol}]")
-        for addr in candidates:
-            deposit = format_deposit(chain_config['name'], deposits.get(addr, 0))
-            print(f"  {addr[:10]}...{addr[-6:]} ({collators.get(addr, 'UNKNOWN')}) - {deposit} {token_symbol}")
+        records = [{
+            "type": "chain",
+            "chain": name,
+            "rpc_url": chain_config["rpc_url"],
+            "checked_at": datetime.now().isoformat(timespec='seconds'),
+            "token": token_symbol,
+            "decimals": token_decimals(name),
+            "invulnerables": len(invulnerables),
+            "candidates": len(candidates),
+        }]
+        for role, addresses in (("invulnerable", invulnerables), ("candidate", candidates)):
+            records += [{
+                "type": "collator",
+                "chain": name,
+                "address": addr,
+                "name": collators.get(addr, 'UNKNOWN'),
+                "role": role,
+                "deposit": deposits.get(addr, 0),
+                "known": addr in collators,
+            } for addr in addresses]
         
         # Check specific collators
-        check_collator("LUCKYFRIDAY.IO", invulnerables, candidates, collators)
-        
-        # Detect unknowns
-        unknown = [addr for addr in invulnerables + candidates if addr not in collators]
-        if unknown:
-            print("\n⚠️ Unknown Collators Detected:")
-            for addr in unknown:
-                deposit = format_deposit(chain_config['name'], deposits.get(addr, 0))
-                print(f"  {addr} - {deposit} {token_symbol}")
-        
-        return True
+        records.append(check_collator(WATCHED_COLLATOR, invulnerables, candidates, collators, chain=name))
     
     except Exception as e:
-        print(f"\n❌ Error checking {chain_config['name']}: {str(e)}")
-        return False
+        records = [{"type": "error", "chain": name, "rpc_url": chain_config["rpc_url"], "error": str(e)}]
+    
+    else:
+        # The history is a side product; failing to write it must not fail the check
+        try:
+            save_snapshot(chain_config, deposits, desired_candidates, candidacy_bond)
+        except OSError as e:
+            print(f"⚠️ Could not record history for {name}: {e}", file=sys.stderr)
+    
+    writer.write_chain(records)
+    return records[0]["type"] != "error"
 
-def check_collator(name, invulnerables, candidates, collators):
-    target_address = None
+def find_collator_address(name, collators):
     for address, collator_name in collators.items():
         if name.lower() in collator_name.lower():
-            target_address = address
-            break
+            return address
+    return None
+
+def check_collator(name, invulnerables, candidates, collators, chain=None):
+    target_address = find_collator_address(name, collators)
     
     if not target_address:
-        print(f"\n❌ {name} not found in collator registry")
+        status = "unregistered"
+    elif target_address in invulnerables:
+        status = "invulnerable"
+    elif target_address in candidates:
+        status = "candidate"
+    else:
+        status = "inactive"
+    return {"type": "watch", "chain": chain, "name": name, "address": target_address, "status": status}
+
+MAX_BACKOFF = 3600  # seconds between retries of a chain that keeps failing
+MIN_BLOCKS_FOR_BLOCK_TIME = 10  # blocks observed before the average block time is trusted
+WATCHED_STORAGE = ("Invulnerables", "CandidateList")
+
+def probe_chain(connections, chain):
+    """Cheap probe: best block, session index and storage hashes of the collator sets"""
+    name = chain["name"]
+    if name not in connections:
+        connections[name] = SubstrateInterface(url=chain["rpc_url"])
+    substrate = connections[name]
+    
+    observed = {"CurrentIndex": substrate.query("Session", "CurrentIndex").value}
+    for item in WATCHED_STORAGE:
+        key = substrate.create_storage_key("CollatorSelection", item).to_hex()
+        observed[item] = substrate.rpc_request("state_getStorageHash", [key]).get('result')
+    return substrate.get_block_number(None), observed
+
+def track_session(chain_state, block, session_index, now):
+    """Record where sessions rotate and learn the period from consecutive rotations"""
+    if chain_state["anchor"] is None:
+        chain_state["anchor"] = (block, now)
+    
+    last_index = chain_state["session_index"]
+    if last_index is not None and session_index != last_index:
+        rotation = chain_state["rotation"]
+        # Only a rotation we saw start, followed directly by the next one, measures a period
+        if rotation and rotation[0] == last_index and session_index == last_index + 1:
+            chain_state["period"] = block - rotation[1]
+        chain_state["rotation"] = (session_index, block)
+    chain_state["session_index"] = session_index
+
+def seconds_to_rotation(chain_state, chain_config, block, now):
+    """Estimated seconds until the next session change, or None while it is unknown"""
+    period = chain_config.get("session_period_blocks") or chain_state["period"]
+    anchor_block, anchor_time = chain_state["anchor"]
+    if not period or block - anchor_block < MIN_BLOCKS_FOR_BLOCK_TIME:
+        return None
+    block_time = (now - anchor_time) / (block - anchor_block)
+    
+    if chain_state["rotation"]:
+        session_start = chain_state["rotation"][1]
+    elif chain_config.get("session_period_blocks"):
+        # An exact configured period: PeriodicSessions rotates when (block - offset) % period == 0
+        session_start = block - (block - chain_config.get("session_offset_blocks", 0)) % period
+    else:
+        return None
+    return (session_start + period - block) * block_time
+
+def run_scheduler(config, probe_interval, idle_interval, writer, check=check_chain, probe=probe_chain):
+    chains = config["polkadot_chains"] + config["kusama_chains"]
+    state = {
+        chain["name"]: {
+            "next_probe": 0,
+            "observed": None,
+            "failures": 0,
+            "anchor": None,
+            "session_index": None,
+            "rotation": None,
+            "period": None,
+        }
+        for chain in chains
+    }
+    connections = {}
+    
+    writer.text(f"🗓️ Session-aware scheduler started - probing every {idle_interval}s, "
+                f"every {probe_interval}s around session changes")
+    while True:
+        for chain in chains:
+            name = chain["name"]
+            chain_state = state[name]
+            now = time.time()
+            if now < chain_state["next_probe"]:
+                continue
+            
+            try:
+                block, observed = probe(connections, chain)
+            except Exception as e:
+                writer.write_chain([{"type": "error", "chain": name, "rpc_url": chain["rpc_url"], "error": str(e)}])
+                connections.pop(name, None)
+                observed = None
+            
+            ok = observed is not None
+            if ok:
+                track_session(chain_state, block, observed["CurrentIndex"], now)
+                previous = chain_state["observed"]
+                if observed != previous:
+                    if previous is None:
+                        writer.text(f"\n🔔 {name}: initial full check")
+                    elif observed["CurrentIndex"] != previous["CurrentIndex"]:
+                        writer.text(f"\n⏱️ {name}: session {observed['CurrentIndex']} started, running full check")
+                    else:
+                        writer.text(f"\n🔔 {name}: collator storage changed, running full check")
+                    # Observed before the check, so a change during it is seen by the next probe
+                    ok = check(chain, writer)
+                    if ok:
+                        chain_state["observed"] = observed
+                        seconds_left = seconds_to_rotation(chain_state, chain, block, now)
+                        if seconds_left is None:
+                            writer.text(f"\n⏱️ {name}: session {observed['CurrentIndex']}, next rotation not yet known")
+                        else:
+                            writer.text(f"\n⏱️ {name}: session {observed['CurrentIndex']}, "
+                                        f"next rotation in ~{max(seconds_left, 0) / 60:.0f} min")
+            
+            if ok:
+                # Probe rarely while the rotation is far off, densely once it is due or unknown
+                chain_state["failures"] = 0
+                seconds_left = seconds_to_rotation(chain_state, chain, block, now)
+                if seconds_left is None or seconds_left <= 0:
+                    delay = probe_interval
+                else:
+                    delay = min(idle_interval, seconds_left)
+            else:
+                # Failed chains are retried with exponential backoff instead of every loop
+                chain_state["failures"] += 1
+                delay = min(probe_interval * 2 ** chain_state["failures"], max(MAX_BACKOFF, probe_interval))
+            chain_state["next_probe"] = now + delay
+        
+        writer.flush()
+        wake = min(s["next_probe"] for s in state.values())
+        time.sleep(max(wake - time.time(), 1))
+
+AURA_ENGINE_ID = b"aura"
+
+def aura_digest(header):
+    """Return (slot, authorities_changed) from the Aura logs of a header digest"""
+    slot, changed = None, False
+    for log in header["digest"]["logs"]:
+        item = getattr(log, "value", log)
+        if isinstance(item, str):
+            # Undecoded DigestItem: 0x06 PreRuntime / 0x04 Consensus, engine id, compact length, payload
+            raw = bytes.fromhex(item[2:])
+            if raw[1:5] == AURA_ENGINE_ID:
+                if raw[0] == 6:
+                    slot = int.from_bytes(raw[6:14], "little")
+                elif raw[0] == 4:
+                    changed = True
+            continue
+        for kind in ("PreRuntime", "Consensus"):
+            engine, data = item.get(kind, (None, None))
+            if engine != "0x" + AURA_ENGINE_ID.hex():
+                continue
+            if kind == "PreRuntime":
+                slot = int.from_bytes(bytes.fromhex(data[2:18]), "little")
+            else:
+                changed = True
+    return slot, changed
+
+def record_slot(tracker, slot):
+    """Credit `slot` to its author and charge every skipped slot to its owner"""
+    validators = tracker["validators"]
+    last_slot = tracker["last_slot"]
+    if last_slot is not None:
+        if slot <= last_slot:
+            return None  # another block in the same slot, or a fork we already counted
+        # Anything older than a full window per collator would be dropped anyway
+        first_missed = max(last_slot + 1, slot - len(validators) * tracker["window"])
+        for missed in range(first_missed, slot):
+            tracker["history"][validators[missed % len(validators)]].append(0)
+    
+    author = validators[slot % len(validators)]
+    tracker["history"][author].append(1)
+    tracker["last_slot"] = slot
+    return author
+
+def authorship_report(chain_config, tracker, collators):
+    watched = find_collator_address(WATCHED_COLLATOR, collators)
+    lines = [f"\n📦 {chain_config['name']} authorship (last {tracker['window']} slots per collator)"]
+    for addr in tracker["validators"]:
+        history = tracker["history"][addr]
+        produced = sum(history)
+        missed = len(history) - produced
+        marker = "⭐" if addr == watched else "  "
+        status = "⚠️" if missed else "✅"
+        lines.append(f"{marker}{status} {addr[:10]}...{addr[-6:]} ({collators.get(addr, 'UNKNOWN')}) - "
+                     f"{produced} produced, {missed} missed")
+    return "\n".join(lines)
+
+def track_chain_authorship(chain_config, window, report_every, deadline):
+    with open(Path(__file__).parent / chain_config["collator_file"], encoding='utf-8') as f:
+        collators = json.load(f)
+    
+    tracker = {
+        "window": window,
+        "validators": [],
+        "last_slot": None,
+        "blocks": 0,
+        "history": defaultdict(lambda: deque(maxlen=window)),
+    }
+    
+    def handle_header(obj, update_nr, subscription_id):
+        header = obj["header"]
+        slot, authorities_changed = aura_digest(header)
+        if slot is not None and tracker["validators"]:
+            record_slot(tracker, slot)
+            tracker["blocks"] += 1
+        
+        if authorities_changed:
+            # The new set authors from the next block onwards; new-heads headers carry
+            # no hash, so read the set at this block's own height rather than the best head
+            print(authorship_report(chain_config, tracker, collators))
+            number = header["number"]
+            if isinstance(number, str):
+                number = int(number, 16)
+            block_hash = substrate.get_block_hash(number)
+            tracker["validators"] = substrate.query("Session", "Validators", block_hash=block_hash).value
+            print(f"\n🔄 {chain_config['name']}: validator set changed at #{number} "
+                  f"({len(tracker['validators'])} collators)")
+        elif tracker["blocks"] and tracker["blocks"] % report_every == 0:
+            print(authorship_report(chain_config, tracker, collators))
+        sys.stdout.flush()
+        
+        if deadline and time.time() >= deadline:
+            return tracker
+    
+    while not deadline or time.time() < deadline:
+        try:
+            substrate = SubstrateInterface(url=chain_config["rpc_url"])
+            tracker["validators"] = substrate.query("Session", "Validators").value
+            tracker["last_slot"] = None  # slots missed while disconnected are not held against anyone
+            print(f"\n📡 Tracking authorship on {chain_config['name']} ({len(tracker['validators'])} collators)")
+            substrate.subscribe_block_headers(handle_header)
+        except Exception as e:
+            print(f"\n❌ Authorship tracking error on {chain_config['name']}: {str(e)}")
+            time.sleep(10)
+    
+    print(authorship_report(chain_config, tracker, collators))
+
+def run_authorship_tracker(config, window, report_every, duration):
+    deadline = time.time() + duration if duration else None
+    threads = [
+        threading.Thread(target=track_chain_authorship, args=(chain, window, report_every, deadline), daemon=True)
+        for chain in config["polkadot_chains"] + config["kusama_chains"]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+def load_history(chain_name):
+    """All stored snapshots of a chain as one structured array, or None"""
+    import numpy as np
+    
+    path = HISTORY_DIR / f"{chain_name}.bin"
+    if not path.exists():
+        return None
+    return np.fromfile(path, dtype=np.dtype(HISTORY_DTYPE))
+
+def analyse_chain(chain_name, rows, watched, trend_days, bucket_days):
+    """Candidacy competitiveness over every stored snapshot of one chain"""
+    import numpy as np
+    
+    scale = 10 ** token_decimals(chain_name)
+    
+    # Rows are appended a snapshot at a time, so a new timestamp starts a new snapshot
+    new_snapshot = np.diff(rows["timestamp"], prepend=rows["timestamp"][0] - 1) != 0
+    first = np.flatnonzero(new_snapshot)
+    snapshot = np.cumsum(new_snapshot) - 1
+    order = np.argsort(rows["timestamp"][first], kind="stable")
+    
+    # Sorting 64-byte addresses dominates np.unique, so deduplicate on a 64-bit key instead
+    candidate = ~np.isnan(rows["deposit"])
+    who = np.ascontiguousarray(rows["who"][candidate])
+    words = who.view(np.uint64).reshape(len(who), who.itemsize // 8)
+    keys = (words * np.arange(1, 2 * words.shape[1], 2, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)).sum(axis=1)
+    _, first_seen, column = np.unique(keys, return_index=True, return_inverse=True)
+    addresses = who[first_seen]
+    
+    # One row per snapshot, one column per candidate ever seen; NaN = not a candidate
+    deposits = np.full((len(first), max(len(addresses), 1)), np.nan)
+    deposits[snapshot[candidate], column] = rows["deposit"][candidate] / scale
+    deposits = deposits[order]
+    
+    times = rows["timestamp"][first][order].astype(float)
+    desired = rows["desired"][first][order].astype(int)
+    bond = rows["bond"][first][order] / scale
+    present = ~np.isnan(deposits)
+    counts = present.sum(axis=1)
+    
+    # Deposits sorted high to low, absent candidates pushed to the end as -inf
+    ranked = -np.sort(np.where(present, -deposits, np.inf), axis=1)
+    at = np.arange(len(times))
+    last_col = deposits.shape[1] - 1
+    
+    # Entering needs a deposit above the lowest selected candidate once the set is full;
+    # with DesiredCandidates at 0 there is no way in at all
+    full = counts >= desired
+    min_entry = np.where(full, ranked[at, np.clip(desired - 1, 0, last_col)], bond)
+    min_entry[desired <= 0] = np.nan
+    
+    # Linear-interpolated percentiles read straight off the sorted rows
+    # (np.nanpercentile falls back to a per-row Python loop). Rows without candidates
+    # interpolate between -inf values, which is masked out below.
+    position = np.array(PERCENTILES)[:, None] / 100 * (np.maximum(counts, 1) - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.ceil(position).astype(int)
+    low_values = ranked[at, np.clip(counts - 1 - lower, 0, last_col)]
+    high_values = ranked[at, np.clip(counts - 1 - upper, 0, last_col)]
+    with np.errstate(invalid="ignore"):
+        interpolated = low_values + (high_values - low_values) * (position - lower)
+    percentiles = np.where(counts > 0, interpolated, np.nan)
+    
+    # Average the percentiles over fixed-width time buckets
+    bucket = np.floor((times - times[0]) / (bucket_days * 86400)).astype(int)
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    filled = ~np.isnan(percentiles)
+    with np.errstate(invalid="ignore"):
+        bucket_means = (np.add.reduceat(np.where(filled, percentiles, 0), starts, axis=1)
+                        / np.add.reduceat(filled, starts, axis=1))
+    
+    result = {
+        "chain": chain_name,
+        "snapshots": len(times),
+        "desired_candidates": int(desired[-1]),
+        "candidates": int(counts[-1]),
+        "min_entry_deposit": float(min_entry[-1]),
+        "percentiles": dict(zip(PERCENTILES, percentiles[:, -1].tolist())),
+        "percentile_history": [
+            (int(times[start]), dict(zip(PERCENTILES, means)))
+            for start, means in zip(starts, bucket_means.T.tolist())
+        ],
+        "watched": watched,
+    }
+    
+    watched_column = np.flatnonzero(addresses == (watched or "").encode())
+    if not watched_column.size:
+        return result
+    
+    own = deposits[:, watched_column[0]]
+    rank = np.where(np.isnan(own), np.nan, (deposits > own[:, None]).sum(axis=1) + 1)
+    
+    # Inside the set: margin over the strongest candidate left outside (or the bond if there
+    # is room). Outside: margin against the deposit needed to get in, so it comes out negative.
+    in_set = rank <= desired
+    challenger = np.where(counts > desired, ranked[at, np.clip(desired, 0, last_col)], bond)
+    margin = np.where(in_set, own - challenger, own - min_entry)
+    
+    # Linear trend of the margin over the recent window; eviction when it reaches zero
+    recent = (times >= times[-1] - trend_days * 86400) & ~np.isnan(margin)
+    eviction_days = None
+    slope = 0.0
+    if recent.sum() >= 2 and np.ptp(times[recent]) > 0:
+        days = times[recent] / 86400
+        slope = np.polyfit(days - days.mean(), margin[recent], 1)[0]
+        # Treat drift below a millionth of the margin over the window as flat (fit noise)
+        if abs(slope) * trend_days <= 1e-6 * max(abs(margin[-1]), 1):
+            slope = 0.0
+        if slope < 0 and margin[-1] > 0:
+            eviction_days = float(margin[-1] / -slope)
+    
+    result.update({
+        "rank": None if np.isnan(rank[-1]) else int(rank[-1]),
+        "rank_margin": None if np.isnan(rank[-1]) else int(desired[-1] - rank[-1]),
+        "deposit": None if np.isnan(own[-1]) else float(own[-1]),
+        "deposit_margin": None if np.isnan(margin[-1]) else float(margin[-1]),
+        "margin_trend_per_day": float(slope),
+        "days_to_eviction": eviction_days,
+    })
+    return result
+
+def print_analysis(result):
+    print(f"\n{'='*50}")
+    print(f"📈 {result['chain']} - {result['snapshots']} snapshots")
+    print(f"{'='*50}")
+    print(f"  Candidates: {result['candidates']} / {result['desired_candidates']} desired")
+    if result["min_entry_deposit"] != result["min_entry_deposit"]:  # NaN: no candidate slots
+        print("  Minimum deposit to enter: n/a (no candidate slots)")
+    else:
+        print(f"  Minimum deposit to enter: {result['min_entry_deposit']:,.4f}")
+    
+    print("\n📊 Deposit percentiles (" + " / ".join(f"p{p}" for p in PERCENTILES) + ")")
+    for timestamp, values in result["percentile_history"]:
+        row = " / ".join("-" if v != v else f"{v:,.2f}" for v in values.values())
+        print(f"  {datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')}: {row}")
+    
+    if "rank" not in result:
+        print(f"\n❌ {WATCHED_COLLATOR} has never been a candidate")
+        return
+    if result["rank"] is None:
+        print(f"\n❌ {WATCHED_COLLATOR} is not currently a candidate")
         return
     
-    if target_address in invulnerables:
-        print(f"\n✅ {name} found in Invulnerables")
-    elif target_address in candidates:
-        print(f"\n✅ {name} found in Candidates")
+    if result["rank_margin"] >= 0:
+        print(f"\n✅ {WATCHED_COLLATOR} rank {result['rank']} of {result['desired_candidates']} "
+              f"(margin {result['rank_margin']} slots, {result['deposit_margin']:,.4f} over the next challenger)")
+    elif result["deposit_margin"] is None:
+        print(f"\n❌ {WATCHED_COLLATOR} rank {result['rank']} - there are no candidate slots")
+        return
     else:
-        print(f"\n❌ {name} not currently active")
+        print(f"\n❌ {WATCHED_COLLATOR} rank {result['rank']} of {result['desired_candidates']} "
+              f"(needs {-result['deposit_margin']:,.4f} more to enter)")
+    print(f"  Margin trend: {result['margin_trend_per_day']:+,.4f} per day")
+    if result["days_to_eviction"] is not None:
+        print(f"  ⚠️ Eviction in ~{result['days_to_eviction']:.1f} days at the current trend")
+
+def run_analytics(config, trend_days, bucket_days):
+    analysed = 0
+    for chain in config["polkadot_chains"] + config["kusama_chains"]:
+        rows = load_history(chain["name"])
+        if rows is None or not rows.size:
+            continue
+        with open(Path(__file__).parent / chain["collator_file"], encoding='utf-8') as f:
+            collators = json.load(f)
+        watched = find_collator_address(WATCHED_COLLATOR, collators)
+        print_analysis(analyse_chain(chain["name"], rows, watched, trend_days, bucket_days))
+        analysed += 1
+    
+    if not analysed:
+        print(f"❌ No snapshot history in {HISTORY_DIR} - run the checks first")
+
+def profile_checks(check, mode, profile_dir, top, every, frames):
+    """Wrap `check` so every `every`-th run per chain is profiled to `profile_dir`"""
+    profile_dir = Path(profile_dir)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    runs = defaultdict(int)
+    
+    def profiled_check(chain_config, writer):
+        name = chain_config["name"]
+        runs[name] += 1
+        if (runs[name] - 1) % every:
+            return check(chain_config, writer)
+        
+        # The run counter keeps profiles taken within the same second apart
+        path = profile_dir / f"{name}-{mode}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{runs[name]}"
+        summary = io.StringIO()
+        if mode == "cpu":
+            profiler = cProfile.Profile()
+            result = profiler.runcall(check, chain_config, writer)
+            profiler.dump_stats(path.with_suffix(".prof"))
+            # Own time first so decoding hot spots aren't buried under the wrapper frames
+            stats = pstats.Stats(profiler, stream=summary)
+            stats.sort_stats("tottime").print_stats(top)
+            stats.sort_stats("cumulative").print_stats(top)
+        else:
+            tracemalloc.start(frames)
+            try:
+                before = tracemalloc.take_snapshot()
+                result = check(chain_config, writer)
+                after = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            ignore_tracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            before = before.filter_traces(ignore_tracemalloc)
+            after = after.filter_traces(ignore_tracemalloc)
+            after.dump(str(path.with_suffix(".tracemalloc")))
+            
+            # Diff against the start of the check: what each site allocated and kept
+            summary.write(f"Traced at end: {current / 1024:,.1f} KiB, peak during check: {peak / 1024:,.1f} KiB\n")
+            for stat in after.compare_to(before, "traceback" if frames > 1 else "lineno")[:top]:
+                summary.write(f"{stat.size_diff / 1024:+,.1f} KiB ({stat.count_diff:+} blocks), "
+                              f"{stat.size / 1024:,.1f} KiB live\n")
+                summary.writelines(f"    {line}\n" for line in stat.traceback.format())
+        
+        path.with_suffix(".txt").write_text(summary.getvalue(), encoding='utf-8')
+        # stderr keeps the summary out of structured --format output
+        print(f"\n🔬 {mode} profile of {name} written to {path}.*\n{summary.getvalue()}", file=sys.stderr)
+        return result
+    
+    return profiled_check
+
+def send_alert(config, message):
+    import requests
+    
+    payload = {"content": f"🚨 Collator Monitor: {message}"}
+    try:
+        response = requests.post(config["discord_webhook_url"], json=payload, timeout=10)
+        response.raise_for_status()
+        print("✅ Alert sent to Discord")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to send alert: {e}")
+        return False
 
-print(f"🚀 Starting Collator Checks - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-config = load_config()
+def run_checks(config, writer, check=check_chain):
+    writer.text(f"🚀 Starting Collator Checks - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
-# Check all Polkadot chains
-print("\n" + "🌐 POLKADOT CHAINS".center(50, "="))
-for chain in config["polkadot_chains"]:
-    check_chain(chain)
+    # Check all Polkadot chains
+    writer.text("\n" + "🌐 POLKADOT CHAINS".center(50, "="))
+    for chain in config["polkadot_chains"]:
+        check(chain, writer)
     
-# Check all Kusama chains
-print("\n" + "🔴 KUSAMA CHAINS".center(50, "="))
-for chain in config["kusama_chains"]:
-    check_chain(chain)
+    # Check all Kusama chains
+    writer.text("\n" + "🔴 KUSAMA CHAINS".center(50, "="))
+    for chain in config["kusama_chains"]:
+        check(chain, writer)
     
-print("\n" + "✅ ALL CHECKS COMPLETE".center(50, "="))
\ No newline at end of file
+    writer.text("\n" + "✅ ALL CHECKS COMPLETE".center(50, "="))
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check collator status on the system chains")
+    parser.add_argument("--schedule", action="store_true",
+                        help="run continuously, with full checks after each session change")
+    parser.add_argument("--probe-interval", type=positive_int, default=60,
+                        help="seconds between probes around a session change in --schedule mode (default: 60)")
+    parser.add_argument("--idle-interval", type=positive_int, default=900,
+                        help="longest gap between probes while the next session change is far off (default: 900)")
+    parser.add_argument("--track-authorship", action="store_true",
+                        help="follow new heads and count produced/missed blocks per collator")
+    parser.add_argument("--window", type=positive_int, default=600,
+                        help="slots kept per collator for --track-authorship (default: 600)")
+    parser.add_argument("--report-every", type=positive_int, default=100,
+                        help="blocks between authorship reports (default: 100)")
+    parser.add_argument("--duration", type=int, default=0,
+                        help="stop --track-authorship after this many seconds (default: run forever)")
+    parser.add_argument("--analytics", action="store_true",
+                        help="analyse the stored deposit history (requires numpy)")
+    parser.add_argument("--trend-days", type=positive_int, default=30,
+                        help="days of history used for the eviction trend (default: 30)")
+    parser.add_argument("--bucket-days", type=positive_int, default=30,
+                        help="width of the deposit percentile buckets in days (default: 30)")
+    parser.add_argument("--format", choices=("text", "ndjson", "csv", "json"), default="text",
+                        help="output format for check results (default: text)")
+    parser.add_argument("--profile", choices=("cpu", "alloc"),
+                        help="profile each chain check with cProfile (cpu) or tracemalloc (alloc)")
+    parser.add_argument("--profile-dir", default=str(Path(__file__).parent / "profiles"),
+                        help="where per-chain profiles are written (default: ./profiles)")
+    parser.add_argument("--profile-top", type=int, default=20,
+                        help="hot functions / allocation sites in each summary (default: 20)")
+    parser.add_argument("--profile-every", type=int, default=1,
+                        help="profile only every Nth check of each chain (default: 1)")
+    parser.add_argument("--profile-frames", type=int, default=1,
+                        help="traceback depth recorded by tracemalloc (default: 1)")
+    parser.add_argument("--send-alert", metavar="MESSAGE",
+                        help="send MESSAGE to the Discord webhook and exit")
+    parser.add_argument("--test", action="store_true",
+                        help="send a test alert to the Discord webhook and exit")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    config = load_config()
+    
+    if args.send_alert or args.test:
+        sent = send_alert(config, args.send_alert or "test alert")
+        sys.exit(0 if sent else 1)
+    elif args.analytics:
+        run_analytics(config, args.trend_days, args.bucket_days)
+    elif args.track_authorship:
+        run_authorship_tracker(config, args.window, args.report_every, args.duration)
+    else:
+        writer = RecordWriter(args.format)
+        check = check_chain
+        if args.profile:
+            check = profile_checks(check_chain, args.profile, args.profile_dir, args.profile_top,
+                                   max(args.profile_every, 1), max(args.profile_frames, 1))
+        try:
+            if args.schedule:
+                run_scheduler(config, args.probe_interval, args.idle_interval, writer, check)
+            else:
+                run_checks(config, writer, check)
+        finally:
+            writer.close()
+
+if __name__ == "__main__":
+    main()
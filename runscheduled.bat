@@ -0,0 +1,9 @@
+@echo off
+cd /d "%~dp0"
+if not exist "logs" mkdir logs
+
+python check_collators.py --schedule >> logs\monitor.log 2>> logs\errors.log
+if %errorlevel% neq 0 (
+    echo [%date%_%time%] ERROR >> logs\errors.log
+    python check_collators.py --send-alert "Scheduler exited with error"
+)
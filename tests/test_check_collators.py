@@ -0,0 +1,535 @@
+import csv
+import io
+import json
+import sys
+from collections import defaultdict, deque
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("substrateinterface")
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import check_collators as cc
+
+
+def aura_pre_runtime(slot):
+    return "0x06" + b"aura".hex() + "20" + slot.to_bytes(8, "little").hex()
+
+
+class DecodedLog:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeValue:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeSubstrate:
+    storage = {
+        "Invulnerables": ["HPUEzi4v3YJmhBfSbcGEFFiNKPAGVnGkfDiUzBNTR7j1CxT", "XUnknown000000000000000000000000000000000001"],
+        "CandidateList": [
+            {"who": "E5G5qLNBF7nwhemokqNrNwUCQ7oHrLsBVjSc7XhTdRq8672", "deposit": 12345678901234},
+            {"who": "YUnknown000000000000000000000000000000000002", "deposit": 5 * 10 ** 12},
+        ],
+        "DesiredCandidates": 20,
+        "CandidacyBond": 10 ** 12,
+    }
+
+    def __init__(self, url):
+        if "down" in url:
+            raise ConnectionError("connection refused")
+
+    def query(self, pallet, item, block_hash=None):
+        return FakeValue(self.storage[item])
+
+    def rpc_request(self, method, params):
+        return {"result": {"tokenSymbol": ["KSM"]}}
+
+
+KUSAMA_CHAIN = {"name": "AssetHub-Kusama", "rpc_url": "wss://up", "collator_file": "kusama_collators.json"}
+
+
+@pytest.fixture
+def fake_chain(monkeypatch, tmp_path):
+    monkeypatch.setattr(cc, "SubstrateInterface", FakeSubstrate)
+    monkeypatch.setattr(cc, "HISTORY_DIR", tmp_path / "history")
+
+
+def new_tracker(validators, window=5):
+    return {
+        "window": window,
+        "validators": validators,
+        "last_slot": None,
+        "blocks": 0,
+        "history": defaultdict(lambda: deque(maxlen=window)),
+    }
+
+
+def test_aura_digest_raw_items():
+    header = {"digest": {"logs": [aura_pre_runtime(123456), "0x04" + b"aura".hex() + "00"]}}
+    assert cc.aura_digest(header) == (123456, True)
+
+
+def test_aura_digest_decoded_items():
+    slot = (2 ** 40 + 7).to_bytes(8, "little").hex()
+    header = {"digest": {"logs": [
+        DecodedLog({"PreRuntime": ("0x" + b"BABE".hex(), "0x" + "00" * 8)}),
+        DecodedLog({"PreRuntime": ("0x" + b"aura".hex(), "0x" + slot)}),
+        DecodedLog({"Seal": ("0x" + b"aura".hex(), "0x" + "00" * 64)}),
+    ]}}
+    assert cc.aura_digest(header) == (2 ** 40 + 7, False)
+
+
+def test_aura_digest_without_aura_logs():
+    assert cc.aura_digest({"digest": {"logs": []}}) == (None, False)
+
+
+def test_record_slot_charges_skipped_slots_to_their_owners():
+    tracker = new_tracker(["a", "b", "c"])
+    authors = [cc.record_slot(tracker, slot) for slot in (0, 1, 3, 3, 7)]
+    assert authors == ["a", "b", "a", None, "b"]
+    # slot 2 (c), 4 (b), 5 (c) and 6 (a) were missed
+    assert {k: list(v) for k, v in tracker["history"].items()} == {
+        "a": [1, 1, 0],
+        "b": [1, 0, 1],
+        "c": [0, 0],
+    }
+
+
+def test_record_slot_caps_long_gaps_to_the_window():
+    tracker = new_tracker(["a", "b"], window=3)
+    cc.record_slot(tracker, 0)
+    cc.record_slot(tracker, 1001)
+    assert list(tracker["history"]["a"]) == [0, 0, 0]
+    assert list(tracker["history"]["b"]) == [0, 0, 1]
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    """Write snapshots one day apart and return them as analyse_chain input"""
+    monkeypatch.setattr(cc, "HISTORY_DIR", tmp_path)
+
+    def write(snapshots, desired=3, bond=1, chain="People-Polkadot"):
+        scale = 10 ** cc.token_decimals(chain)
+        for day, deposits in enumerate(snapshots):
+            monkeypatch.setattr(cc.time, "time", lambda: 1_700_000_000 + day * 86400)
+            cc.save_snapshot({"name": chain}, {k: v * scale for k, v in deposits.items()}, desired, bond * scale)
+        return cc.load_history(chain)
+
+    return write
+
+
+def test_analyse_chain_percentiles_match_numpy(history):
+    np = pytest.importorskip("numpy")
+    snapshots = [{f"c{i}": 10 + i * day + i ** 2 for i in range(7)} for day in range(4)]
+    result = cc.analyse_chain("People-Polkadot", history(snapshots), "W", 30, 1)
+    expected = np.percentile(list(snapshots[-1].values()), cc.PERCENTILES)
+    assert list(result["percentiles"].values()) == pytest.approx(expected)
+    assert [list(v.values()) for _, v in result["percentile_history"]][0] == pytest.approx(
+        np.percentile(list(snapshots[0].values()), cc.PERCENTILES))
+
+
+def test_analyse_chain_rank_and_entry_threshold(history):
+    pytest.importorskip("numpy")
+    rows = history([{"a": 100, "b": 90, "c": 80, "d": 60, "W": 51}])
+    result = cc.analyse_chain("People-Polkadot", rows, "W", 30, 30)
+    assert result["rank"] == 5
+    assert result["rank_margin"] == -2
+    assert result["min_entry_deposit"] == pytest.approx(80)
+    assert result["deposit_margin"] == pytest.approx(-29)
+
+
+def test_analyse_chain_margin_inside_the_set(history):
+    pytest.importorskip("numpy")
+    rows = history([{"a": 100, "W": 90, "c": 80, "d": 60}])
+    result = cc.analyse_chain("People-Polkadot", rows, "W", 30, 30)
+    assert result["rank"] == 2
+    assert result["deposit_margin"] == pytest.approx(30)
+
+
+def test_analyse_chain_flat_trend_has_no_eviction(history):
+    pytest.importorskip("numpy")
+    rows = history([{"a": 100, "b": 90, "W": 85.3, "d": 60.7}] * 40)
+    result = cc.analyse_chain("People-Polkadot", rows, "W", 30, 30)
+    assert result["margin_trend_per_day"] == 0
+    assert result["days_to_eviction"] is None
+
+
+def test_analyse_chain_declining_trend(history):
+    pytest.importorskip("numpy")
+    rows = history([{"a": 100, "b": 90, "W": 85, "d": 60 + day} for day in range(20)])
+    result = cc.analyse_chain("People-Polkadot", rows, "W", 30, 30)
+    assert result["margin_trend_per_day"] == pytest.approx(-1)
+    assert result["days_to_eviction"] == pytest.approx(6)
+
+
+def test_analyse_chain_without_candidates(history, recwarn):
+    np = pytest.importorskip("numpy")
+    result = cc.analyse_chain("People-Polkadot", history([{}, {}], desired=0), "W", 30, 30)
+    assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
+    assert np.isnan(result["min_entry_deposit"])
+    assert all(np.isnan(v) for v in result["percentiles"].values())
+    assert "rank" not in result
+
+
+def test_check_chain_survives_history_write_failure(fake_chain, tmp_path, monkeypatch, capsys):
+    (tmp_path / "history").write_text("not a directory")
+    out = io.StringIO()
+    assert cc.check_chain(KUSAMA_CHAIN, cc.RecordWriter("ndjson", out))
+    assert '"type": "error"' not in out.getvalue()
+    assert "Could not record history" in capsys.readouterr().err
+
+
+# Output of the original print-based check_chain for the FakeSubstrate data
+EXPECTED_TEXT = """
+==================================================
+🔍 Checking AssetHub-Kusama
+📡 RPC: wss://up
+==================================================
+
+🔷 Invulnerable Collators (2)
+  HPUEzi4v3Y...7j1CxT (LUCKYFRIDAY.IO)
+  XUnknown00...000001 (UNKNOWN)
+
+🔶 Candidate Collators (2) [Deposit in KSM]
+  E5G5qLNBF7...Rq8672 (STAKE PLUS/ASSETHUB-KSM-0) - 12.3457 KSM
+  YUnknown00...000002 (UNKNOWN) - 5.0000 KSM
+
+✅ LUCKYFRIDAY.IO found in Invulnerables
+
+⚠️ Unknown Collators Detected:
+  XUnknown000000000000000000000000000000000001 - 0.0000 KSM
+  YUnknown000000000000000000000000000000000002 - 5.0000 KSM
+
+==================================================
+🔍 Checking AssetHub-Kusama
+📡 RPC: wss://down
+==================================================
+
+❌ Error checking AssetHub-Kusama: connection refused
+"""
+
+
+def run_checks(fmt):
+    out = io.StringIO()
+    writer = cc.RecordWriter(fmt, out)
+    cc.check_chain(KUSAMA_CHAIN, writer)
+    cc.check_chain({**KUSAMA_CHAIN, "rpc_url": "wss://down"}, writer)
+    writer.close()
+    return out.getvalue()
+
+
+def test_text_output_matches_the_original_report(fake_chain):
+    assert run_checks("text") == EXPECTED_TEXT
+
+
+def test_ndjson_output(fake_chain):
+    records = [json.loads(line) for line in run_checks("ndjson").splitlines()]
+    assert [r["type"] for r in records] == ["chain", "collator", "collator", "collator", "collator", "watch", "error"]
+    assert records[0]["token"] == "KSM" and records[0]["decimals"] == 12
+    assert records[3] == {
+        "type": "collator",
+        "chain": "AssetHub-Kusama",
+        "address": "E5G5qLNBF7nwhemokqNrNwUCQ7oHrLsBVjSc7XhTdRq8672",
+        "name": "STAKE PLUS/ASSETHUB-KSM-0",
+        "role": "candidate",
+        "deposit": 12345678901234,
+        "known": True,
+    }
+    assert records[5]["status"] == "invulnerable"
+    assert records[6]["error"] == "connection refused"
+
+
+def test_records_start_with_type_then_chain(fake_chain):
+    for line in run_checks("ndjson").splitlines():
+        assert list(json.loads(line))[:2] == ["type", "chain"]
+
+
+def test_json_output_is_one_array(fake_chain):
+    assert json.loads(run_checks("json")) == [json.loads(line) for line in run_checks("ndjson").splitlines()]
+
+
+def test_json_output_without_records():
+    out = io.StringIO()
+    cc.RecordWriter("json", out).close()
+    assert json.loads(out.getvalue()) == []
+
+
+def test_csv_output(fake_chain):
+    rows = list(csv.DictReader(io.StringIO(run_checks("csv"))))
+    assert len(rows) == 7
+    assert list(rows[0]) == list(cc.RECORD_FIELDS)
+    assert rows[4]["address"] == "YUnknown000000000000000000000000000000000002"
+    assert rows[4]["known"] == "False"
+    assert rows[6]["type"] == "error"
+
+
+def test_structured_output_skips_text_lines():
+    out = io.StringIO()
+    writer = cc.RecordWriter("ndjson", out)
+    writer.text("🚀 Starting Collator Checks")
+    writer.close()
+    assert out.getvalue() == ""
+
+
+class StopScheduler(Exception):
+    pass
+
+
+SCHEDULED_CHAIN = {"name": "X", "rpc_url": "wss://x", "collator_file": "kusama_collators.json"}
+
+
+def run_scheduler(monkeypatch, observe, check_results=None, loops=10, probe_interval=60,
+                  idle_interval=900, chain=SCHEDULED_CHAIN):
+    """Drive run_scheduler on a fake clock; observe(now) returns (block, observed) or raises"""
+    clock = {"now": 1000.0, "loops": 0}
+    probes, checks = [], []
+    check_results = list(check_results or [])
+
+    def probe(connections, chain_config):
+        probes.append(clock["now"])
+        return observe(clock["now"])
+
+    def check(chain_config, writer):
+        checks.append(clock["now"])
+        return check_results.pop(0) if check_results else True
+
+    def sleep(seconds):
+        clock["loops"] += 1
+        if clock["loops"] >= loops:
+            raise StopScheduler
+        clock["now"] += seconds
+
+    monkeypatch.setattr(cc.time, "time", lambda: clock["now"])
+    monkeypatch.setattr(cc.time, "sleep", sleep)
+    config = {"polkadot_chains": [chain], "kusama_chains": []}
+    out = io.StringIO()
+    with pytest.raises(StopScheduler):
+        cc.run_scheduler(config, probe_interval, idle_interval, cc.RecordWriter("text", out), check, probe)
+    return probes, checks, out.getvalue()
+
+
+def steady(session=1, hashes=("0x1", "0x2")):
+    return lambda now: (int(now // 6), {"CurrentIndex": session, "Invulnerables": hashes[0], "CandidateList": hashes[1]})
+
+
+def test_scheduler_runs_an_initial_full_check(monkeypatch):
+    probes, checks, out = run_scheduler(monkeypatch, steady(), loops=1)
+    assert checks == [1000.0]
+    assert "initial full check" in out
+
+
+def test_scheduler_skips_checks_while_nothing_changes(monkeypatch):
+    probes, checks, _ = run_scheduler(monkeypatch, steady(), loops=5)
+    assert len(probes) == 5
+    assert checks == [1000.0]
+
+
+def test_scheduler_checks_when_only_the_session_changes(monkeypatch):
+    def observe(now):
+        return steady(session=1 if now < 1100 else 2)(now)
+
+    probes, checks, out = run_scheduler(monkeypatch, observe, loops=5)
+    assert checks == [1000.0, 1120.0]
+    assert "session 2 started" in out
+
+
+def test_scheduler_checks_when_a_collator_set_changes(monkeypatch):
+    def observe(now):
+        return steady(hashes=("0x1", "0x2" if now < 1100 else "0x3"))(now)
+
+    _, checks, out = run_scheduler(monkeypatch, observe, loops=5)
+    assert checks == [1000.0, 1120.0]
+    assert "collator storage changed" in out
+
+
+def test_scheduler_failed_check_keeps_old_hashes_and_backs_off(monkeypatch):
+    # Initial check passes, then every check of the changed state fails
+    def observe(now):
+        return steady(hashes=("0x1", "0x2" if now < 1030 else "0x3"))(now)
+
+    probes, checks, _ = run_scheduler(monkeypatch, observe, check_results=[True] + [False] * 20, loops=9)
+    # A failed check is retried on every probe, so the old hashes were kept
+    assert len(checks) == len(probes)
+    gaps = [b - a for a, b in zip(probes[1:], probes[2:])]
+    assert gaps == [120, 240, 480, 960, 1920, 3600, 3600]
+    assert max(gaps) == cc.MAX_BACKOFF
+
+
+def test_scheduler_backs_off_an_unreachable_chain(monkeypatch):
+    def observe(now):
+        raise ConnectionError("connection refused")
+
+    probes, checks, out = run_scheduler(monkeypatch, observe, loops=4)
+    assert checks == []
+    assert [b - a for a, b in zip(probes, probes[1:])] == [120, 240, 480]
+    assert out.count("connection refused") == 4
+
+
+def test_scheduler_learns_the_period_and_probes_at_the_next_rotation(monkeypatch):
+    # 6 s blocks, sessions of 600 blocks (one hour)
+    def observe(now):
+        block = int(now // 6)
+        return block, {"CurrentIndex": block // 600, "Invulnerables": "0x1", "CandidateList": "0x2"}
+
+    probes, checks, out = run_scheduler(monkeypatch, observe, loops=200, probe_interval=60, idle_interval=900)
+    # Every rotation is checked, within one dense probe interval (10 blocks) of happening
+    lags = [int(t // 6) % 600 for t in checks[1:]]
+    assert len(checks) > 3
+    assert all(lag < 10 for lag in lags)
+    assert [int(t // 6) // 600 for t in checks[1:]] == list(range(1, len(checks)))
+    assert "next rotation in ~60 min" in out
+    # After two rotations the gaps stretch to the idle interval
+    assert 900 in [b - a for a, b in zip(probes, probes[1:])]
+
+
+def test_scheduler_uses_a_configured_period_before_any_rotation(monkeypatch):
+    chain = {**SCHEDULED_CHAIN, "session_period_blocks": 600}
+
+    def observe(now):
+        block = int(now // 6)
+        return block, {"CurrentIndex": block // 600, "Invulnerables": "0x1", "CandidateList": "0x2"}
+
+    probes, checks, out = run_scheduler(monkeypatch, observe, loops=6, chain=chain)
+    # Starts at block 166; once the block time is known, idle gaps (150 blocks) run up
+    # to the configured rotation at block 600, where the new session is caught at once
+    assert [int(t // 6) for t in probes] == [166, 176, 326, 476, 600, 750]
+    assert [int(t // 6) for t in checks] == [166, 600]
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+
+@pytest.mark.parametrize("status, exit_code", [(204, 0), (404, 1)])
+def test_send_alert_exit_code(monkeypatch, status, exit_code):
+    posts = []
+
+    def post(url, json, timeout):
+        posts.append((url, json))
+        return FakeResponse(status)
+
+    monkeypatch.setitem(sys.modules, "requests", type(sys)("requests"))
+    monkeypatch.setattr(sys.modules["requests"], "post", post, raising=False)
+    monkeypatch.setattr(cc, "load_config", lambda: {"discord_webhook_url": "https://hook"})
+    monkeypatch.setattr(sys, "argv", ["check_collators.py", "--send-alert", "scheduler exited"])
+    with pytest.raises(SystemExit) as exit_info:
+        cc.main()
+    assert exit_info.value.code == exit_code
+    assert posts == [("https://hook", {"content": "🚨 Collator Monitor: scheduler exited"})]
+
+
+@pytest.mark.parametrize("flag", ["--window", "--report-every", "--bucket-days", "--trend-days",
+                                  "--probe-interval", "--idle-interval"])
+@pytest.mark.parametrize("value", ["0", "-5"])
+def test_non_positive_intervals_are_rejected(monkeypatch, capsys, flag, value):
+    monkeypatch.setattr(sys, "argv", ["check_collators.py", flag, value])
+    with pytest.raises(SystemExit) as exit_info:
+        cc.parse_args()
+    assert exit_info.value.code == 2
+    assert "must be a positive integer" in capsys.readouterr().err
+
+
+OLD_SET = ["OLDaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa1", "OLDbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb2"]
+NEW_SET = ["NEWccccccccccccccccccccccccccccccccccccccccccccc3", "NEWdddddddddddddddddddddddddddddddddddddddddddd4",
+           "NEWeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee5"]
+
+
+def test_authorship_rotation_reads_the_set_at_the_rotation_block(monkeypatch, capsys):
+    block_hashes = []
+    clock = {"now": 0.0}
+    headers = [
+        {"number": "0x63", "digest": {"logs": [aura_pre_runtime(10)]}},
+        # Rotation block: authored by the old set, new set from the next block
+        {"number": "0x64", "digest": {"logs": [aura_pre_runtime(11), "0x04" + b"aura".hex() + "00"]}},
+        {"number": "0x65", "digest": {"logs": [aura_pre_runtime(12)]}},
+    ]
+
+    class FakeHeadSubstrate:
+        def __init__(self, url):
+            pass
+
+        def get_block_hash(self, number):
+            block_hashes.append(number)
+            return f"0xhash{number}"
+
+        def query(self, pallet, item, block_hash=None):
+            assert (pallet, item) == ("Session", "Validators")
+            return FakeValue(NEW_SET if block_hash == "0xhash100" else OLD_SET)
+
+        def subscribe_block_headers(self, handler):
+            for update_nr, header in enumerate(headers):
+                handler({"header": header}, update_nr, "sub")
+            clock["now"] = 100.0  # past the deadline, so the tracker stops
+
+    monkeypatch.setattr(cc, "SubstrateInterface", FakeHeadSubstrate)
+    monkeypatch.setattr(cc.time, "time", lambda: clock["now"])
+    cc.track_chain_authorship(KUSAMA_CHAIN, window=10, report_every=1000, deadline=50.0)
+
+    assert block_hashes == [0x64]
+    final_report = capsys.readouterr().out.split("authorship (last 10 slots per collator)")[-1]
+    # Slot 12 belongs to NEW_SET[12 % 3]
+    assert "NEWccccccc...ccccc3 (UNKNOWN) - 1 produced, 0 missed" in final_report
+    assert "NEWddddddd...ddddd4 (UNKNOWN) - 0 produced, 0 missed" in final_report
+    assert "OLD" not in final_report
+
+
+def stub_check(chain_config, writer):
+    payload = [bytes(1000) for _ in range(50)]
+    return {"checked": chain_config["name"], "size": len(payload)}
+
+
+@pytest.mark.parametrize("mode, suffix", [("cpu", ".prof"), ("alloc", ".tracemalloc")])
+def test_profile_checks_writes_profile_and_summary(tmp_path, capsys, mode, suffix):
+    check = cc.profile_checks(stub_check, mode, tmp_path, top=5, every=1, frames=1)
+    assert check(KUSAMA_CHAIN, None) == {"checked": "AssetHub-Kusama", "size": 50}
+
+    assert len(list(tmp_path.glob(f"AssetHub-Kusama-{mode}-*-1{suffix}"))) == 1
+    summary, = tmp_path.glob(f"AssetHub-Kusama-{mode}-*-1.txt")
+    assert summary.read_text(encoding="utf-8")
+    assert f"{mode} profile of AssetHub-Kusama" in capsys.readouterr().err
+
+
+def test_cpu_summary_lists_own_time_first(tmp_path):
+    cc.profile_checks(stub_check, "cpu", tmp_path, top=5, every=1, frames=1)(KUSAMA_CHAIN, None)
+    summary = next(tmp_path.glob("*.txt")).read_text(encoding="utf-8")
+    assert summary.index("Ordered by: internal time") < summary.index("Ordered by: cumulative time")
+
+
+def test_alloc_summary_diffs_against_the_start(tmp_path):
+    kept = []
+
+    def leaky_check(chain_config, writer):
+        kept.append(bytearray(200_000))  # allocation site reported below
+        return True
+
+    cc.profile_checks(leaky_check, "alloc", tmp_path, top=5, every=1, frames=1)(KUSAMA_CHAIN, None)
+    summary = next(tmp_path.glob("*.txt")).read_text(encoding="utf-8")
+    assert summary.startswith("Traced at end:")
+    first_site = summary.splitlines()[1:3]
+    assert first_site[0].startswith("+195.")
+    assert "test_check_collators.py" in first_site[1]
+
+
+def test_profile_checks_samples_every_nth_run(tmp_path):
+    calls = []
+
+    def check(chain_config, writer):
+        calls.append(chain_config["name"])
+        return len(calls)
+
+    profiled = cc.profile_checks(check, "cpu", tmp_path, top=5, every=3, frames=1)
+    other_chain = {**KUSAMA_CHAIN, "name": "People-Kusama"}
+    results = [profiled(KUSAMA_CHAIN, None) for _ in range(7)] + [profiled(other_chain, None)]
+
+    assert results == list(range(1, 9))
+    runs = sorted(int(p.stem.rsplit("-", 1)[1]) for p in tmp_path.glob("AssetHub-Kusama-*.prof"))
+    assert runs == [1, 4, 7]
+    assert len(list(tmp_path.glob("People-Kusama-*.prof"))) == 1